@@ -1,8 +1,11 @@
+import heapq
 import json
+import multiprocessing
+import queue
 import re
 import argparse
-from typing import List
-from confluent_kafka import Consumer, Producer, KafkaError, KafkaException
+from typing import Callable, Dict, List
+from confluent_kafka import Consumer, Producer, KafkaError, KafkaException, TopicPartition, OFFSET_BEGINNING, OFFSET_END
 from datetime import datetime
 import logging
 import sys
@@ -10,6 +13,8 @@ from logger import setup_logging
 from protodecoder import ProtoDecoder, VarintStream
 from transcoder import Transcoder
 
+PROGRESS_INTERVAL = 1000
+
 
 def parse_credentials(credentials):
     cred_dict = {}
@@ -36,23 +41,89 @@ def decorate_message(msg, data: bytes, format: str) -> str:
         return data.decode('utf-8')
 
 
-def consume_messages(brokers: str, credentials: List[str], topic: str, key: str, start_time: int, end_time: int, decorate: str, transcoder: Transcoder, writer, **kwargs):
+def parse_partitions(partitions: str) -> List[int]:
+    items = partitions.split(",")
+    for item in items:
+        if not re.fullmatch(r"\d+", item.strip()):
+            raise argparse.ArgumentTypeError(
+                f"Invalid partition '{item}', expected a non-negative integer")
+    return list(dict.fromkeys(int(item) for item in items))
+
+
+def parse_offset(offset: str) -> str:
+    if offset not in ("beginning", "end") and not re.fullmatch(r"-?\d+", offset):
+        raise argparse.ArgumentTypeError(
+            f"Invalid offset '{offset}', expected beginning, end, N or -N")
+    return offset
+
+
+def resolve_offset(consumer, topic: str, partition: int, offset: str) -> int:
+    if offset == "beginning":
+        return OFFSET_BEGINNING
+    if offset == "end":
+        return OFFSET_END
+    value = int(offset)
+    if value >= 0:
+        return value
+    low, high = consumer.get_watermark_offsets(
+        TopicPartition(topic, partition), timeout=10)
+    return max(low, high + value)
+
+
+def topic_partitions(consumer, topic: str) -> List[int]:
+    metadata = consumer.list_topics(topic, timeout=10)
+    topic_metadata = metadata.topics.get(topic)
+    if topic_metadata is None:
+        raise ValueError(f"Topic {topic} not found")
+    if topic_metadata.error:
+        raise KafkaException(topic_metadata.error)
+    if not topic_metadata.partitions:
+        raise ValueError(f"Topic {topic} has no partitions")
+    return sorted(topic_metadata.partitions.keys())
+
+
+def assign_partitions(consumer, topic: str, partitions: List[int], offset: str):
     logger = logging.getLogger(__name__)
+    if not partitions:
+        partitions = topic_partitions(consumer, topic)
+    assignment = [
+        TopicPartition(topic, partition, resolve_offset(
+            consumer, topic, partition, offset or "beginning"))
+        for partition in partitions
+    ]
+    logger.debug(f"Assigning {assignment}")
+    consumer.assign(assignment)
+    return partitions
+
+
+def build_consumer_config(brokers: str, credentials: List[str], assign: bool = False) -> dict:
+    # assign() never joins the group, group.id is only required to create the consumer
     consumer_config = {
         "bootstrap.servers": ",".join(brokers.split(",")),
         "group.id": "kafkacat",
         "auto.offset.reset": "earliest",
     }
+    if assign:
+        consumer_config["enable.auto.commit"] = False
 
     if credentials:
         consumer_config.update(parse_credentials(credentials))
+    return consumer_config
+
 
-    consumer = Consumer(consumer_config)
+def consume_messages(brokers: str, credentials: List[str], topic: str, key: str, start_time: int, end_time: int, decorate: str, transcoder: Transcoder, writer, partitions: List[int] = None, offset: str = None, partition_writers: Dict[int, Callable] = None, binary: bool = False, **kwargs):
+    logger = logging.getLogger(__name__)
+    assign = partitions is not None or offset is not None
+    consumer = Consumer(build_consumer_config(brokers, credentials, assign))
     keys = key.split(',') if key else []
     skip_time = 0
     skip_key = 0
+    finished = set()
     try:
-        consumer.subscribe([topic])
+        if assign:
+            partitions = assign_partitions(consumer, topic, partitions, offset)
+        else:
+            consumer.subscribe([topic])
 
         running = True
         while running:
@@ -68,6 +139,8 @@ def consume_messages(brokers: str, credentials: List[str], topic: str, key: str,
                     )
                 elif msg.error():
                     raise KafkaException(msg.error())
+            elif msg.partition() in finished:
+                continue
             else:
                 timestamp = msg.timestamp()[1]
                 if start_time and timestamp < start_time:
@@ -78,26 +151,129 @@ def consume_messages(brokers: str, credentials: List[str], topic: str, key: str,
                     continue
                 key, decoded_message = transcoder.transcode(
                     msg.key(), msg.value())
-                decorated_message = decorate_message(
-                    msg, decoded_message, decorate
-                )
+                if binary:
+                    decorated_message = decoded_message
+                else:
+                    decorated_message = decorate_message(
+                        msg, decoded_message, decorate
+                    )
 
-                writer(decorated_message)
+                if partition_writers:
+                    partition_writers[msg.partition()](decorated_message)
+                else:
+                    writer(decorated_message)
 
                 if end_time and timestamp >= end_time:
                     logger.debug(
                         f"Reached end_time {msg.partition()} "
                         f"at offset {msg.offset()}."
                     )
-                    running = False
+                    if assign:
+                        consumer.pause(
+                            [TopicPartition(topic, msg.partition())])
+                        finished.add(msg.partition())
+                        running = len(finished) < len(partitions)
+                    else:
+                        running = False
         logger.debug(f"Done {skip_time} messages skipped by time,"
                      f"{skip_key} messages skipped by key")
+        return True
     except Exception as e:
         logger.exception(e)
+        return False
     finally:
         consumer.close()
 
 
+def consume_worker(worker: int, partitions: List[int], output_pattern: str, progress, **kwargs):
+    setup_logging(kwargs["verbose"], kwargs["log_format"])
+    transcoder = create_transcoder(**kwargs)
+    binary = "protobuf" in kwargs["output_format"]
+    files = {partition: open(output_pattern.format(partition=partition), "wb" if binary else "w")
+             for partition in partitions}
+    count = 0
+
+    def partition_writer(file):
+        def write(data):
+            nonlocal count
+            if binary:
+                VarintStream(file).write(data)
+            else:
+                print(data, file=file)
+            count += 1
+            if count % PROGRESS_INTERVAL == 0:
+                progress.put((worker, PROGRESS_INTERVAL))
+        return write
+
+    try:
+        if not consume_messages(**kwargs, partitions=partitions, transcoder=transcoder, writer=None, binary=binary,
+                                partition_writers={partition: partition_writer(file) for partition, file in files.items()}):
+            raise RuntimeError(f"Worker {worker} failed on partitions {partitions}")
+    finally:
+        progress.put((worker, count % PROGRESS_INTERVAL))
+        for file in files.values():
+            file.close()
+
+
+def merge_outputs(paths: List[str], writer):
+    # Interleaves partitions by timestamp keeping each partition's own order,
+    # producer set timestamps are not guaranteed to be monotonic in a partition
+    files = [open(path, "r") for path in paths]
+    try:
+        for line in heapq.merge(*files, key=lambda line: json.loads(line)["timestamp"]):
+            writer(line.rstrip("\n"))
+    finally:
+        for file in files:
+            file.close()
+
+
+def consume_parallel(brokers: str, credentials: List[str], topic: str, workers: int, partitions: List[int], output_pattern: str, merge: bool, writer, **kwargs):
+    logger = logging.getLogger(__name__)
+    if not partitions:
+        consumer = Consumer(build_consumer_config(
+            brokers, credentials, assign=True))
+        try:
+            partitions = topic_partitions(consumer, topic)
+        finally:
+            consumer.close()
+
+    chunks = [partitions[i::workers] for i in range(workers)]
+    progress = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=consume_worker,
+            name=f"worker-{worker}",
+            args=(worker, chunk, output_pattern, progress),
+            kwargs=dict(kwargs, brokers=brokers,
+                        credentials=credentials, topic=topic),
+        )
+        for worker, chunk in enumerate(chunks) if chunk
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {len(processes)} workers for partitions {partitions}")
+
+    total = 0
+    while any(process.is_alive() for process in processes) or not progress.empty():
+        try:
+            worker, count = progress.get(timeout=1)
+        except queue.Empty:
+            continue
+        total += count
+        logger.info(f"Consumed {total} messages")
+
+    for process in processes:
+        process.join()
+    failed = [process.name for process in processes if process.exitcode]
+    if failed:
+        raise RuntimeError(f"Workers failed: {', '.join(failed)}")
+    logger.debug(f"Done {total} messages consumed by {len(processes)} workers")
+
+    if merge:
+        merge_outputs([output_pattern.format(partition=partition)
+                      for partition in partitions], writer)
+
+
 def produce_messages(brokers: str, credentials: List[str], topic: str, key: str, transcoder: Transcoder, reader, **kwargs):
     producer_config = {
         "bootstrap.servers": ",".join(brokers.split(",")),
@@ -135,6 +311,14 @@ class CustomAction(argparse.Action):
         setattr(namespace, self.dest, values)
 
 
+def create_transcoder(proto_files: List[str], decorate: str, **kwargs) -> Transcoder:
+    if proto_files:
+        proto_decoder = ProtoDecoder(proto_files)
+    else:
+        proto_decoder = None
+    return Transcoder(**kwargs, pretty=decorate == "pretty", proto_decoder=proto_decoder)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Read or write Kafka messages.")
@@ -158,6 +342,24 @@ def main():
                             s, "%Y-%m-%dT%H:%M:%S"),
                         help="End time in ISO 8601 format (e.g., '2025-10-02T13:30:00')",
                         )
+    parser.add_argument("--partitions",
+                        type=parse_partitions,
+                        help="Comma-separated list of partitions to consume without a consumer group (default: all when --offset is set)",
+                        )
+    parser.add_argument("--offset",
+                        type=parse_offset,
+                        help="Start offset for assigned partitions: beginning, end, N (absolute) or -N (relative to end) (default: beginning)",
+                        )
+    parser.add_argument("--workers",
+                        type=int,
+                        help="Consume partitions in parallel with N worker processes, writing one output file per partition (optional)",
+                        )
+    parser.add_argument("--output-pattern",
+                        default="out.p{partition}.jsonl",
+                        help="Per-partition output file name for --workers (default: out.p{partition}.jsonl)",
+                        )
+    parser.add_argument("--merge", action="store_true",
+                        help="With --workers, also print all partitions interleaved by timestamp, keeping each partition's order (requires --decorate=json)")
     parser.add_argument("--key",
                         help="Comma separated list of keys for consumer or default key for producer (optional)")
     parser.add_argument("--input-format",
@@ -191,14 +393,6 @@ def main():
     setup_logging(args.verbose, args.log_format)
     logger = logging.getLogger(__name__)
 
-    if args.proto_files:
-        proto_decoder = ProtoDecoder(args.proto_files)
-    else:
-        proto_decoder = None
-
-    transcoder = Transcoder(
-        **vars(args), pretty=args.decorate == "pretty", proto_decoder=proto_decoder, logger=logger)
-
     if args.mode == 'producer':
         if not args.key and not args.input_format == "json_key" and (args.output_format != "json"):
             raise ValueError("Can not guess how to decode without a key")
@@ -209,6 +403,7 @@ def main():
         else:
             def read():
                 return sys.stdin.readline().encode()
+        transcoder = create_transcoder(**vars(args))
         produce_messages(**vars(args), transcoder=transcoder, reader=read)
     else:
         logger.info("Stream From kafka")
@@ -218,7 +413,21 @@ def main():
         else:
             def write(data):
                 print(data)
-        consume_messages(**vars(args), transcoder=transcoder, writer=write)
+        if args.workers is not None:
+            if args.workers < 1:
+                raise ValueError("At least one worker is required")
+            if "{partition}" not in args.output_pattern:
+                raise ValueError("Output pattern must contain {partition}")
+            if "protobuf" in args.output_format and args.decorate != "none":
+                raise ValueError(
+                    "Workers with a protobuf output format require --decorate=none")
+            if args.merge and (args.decorate != "json" or "protobuf" in args.output_format):
+                raise ValueError(
+                    "Merging requires --decorate=json and a non protobuf output format")
+            consume_parallel(**vars(args), writer=write)
+        else:
+            transcoder = create_transcoder(**vars(args))
+            consume_messages(**vars(args), transcoder=transcoder, writer=write)
 
 
 if __name__ == "__main__":
@@ -8,9 +8,11 @@ import tempfile
 import unittest
 from unittest.mock import patch
 from parameterized import parameterized
+from confluent_kafka import Producer
+from confluent_kafka.admin import AdminClient, NewTopic
 from testcontainers.kafka import KafkaContainer
 
-from kafkacat import ProtoDecoder, consume_messages, produce_messages
+from kafkacat import ProtoDecoder, consume_messages, consume_parallel, parse_credentials, produce_messages
 from protodecoder import VarintStream
 from transcoder import Transcoder
 
@@ -64,6 +66,27 @@ class KafkaLoaderTestCase(unittest.TestCase):
     def tearDown(self):
         self.temp_dir.cleanup()
 
+    def credentials(self):
+        return [
+            "security.protocol=SASL_PLAINTEXT",
+            "sasl.mechanisms=PLAIN",
+            f"sasl.username={self.USERNAME}",
+            f"sasl.password={self.PASSWORD}",
+        ]
+
+    def create_topic(self, topic, messages):
+        config = {"bootstrap.servers": self.kafka_brokers}
+        config.update(parse_credentials(self.credentials()))
+        admin = AdminClient(config)
+        admin.create_topics([NewTopic(topic, num_partitions=len(messages))])[
+            topic].result()
+        producer = Producer(config)
+        for partition, values in enumerate(messages):
+            for timestamp, value in values:
+                producer.produce(topic, key=b"test.Main", value=value,
+                                 partition=partition, timestamp=timestamp)
+        producer.flush()
+
     @parameterized.expand(
         [
             ("json.json",),
@@ -127,6 +150,68 @@ class KafkaLoaderTestCase(unittest.TestCase):
 
         self.assertEqual(expected_output, actual_output)
 
+    def test_consume_assigned_partitions(self):
+        self.create_topic("assign-topic", [
+            [(1000, b"a0")],
+            [(1000, b"b0"), (2000, b"b1"), (3000, b"b2")],
+        ])
+        transcoder = Transcoder(
+            input_format="json", output_format="json", pretty=False, proto_decoder=None, key="")
+        lines = []
+
+        consume_messages(
+            brokers=self.kafka_brokers,
+            credentials=self.credentials(),
+            topic="assign-topic",
+            start_time=None,
+            end_time=None,
+            key="",
+            decorate="none",
+            transcoder=transcoder,
+            writer=lines.append,
+            partitions=[1],
+            offset="-2",
+        )
+
+        self.assertEqual(["b1", "b2"], lines)
+
+    def test_consume_parallel(self):
+        self.create_topic("workers-topic", [
+            [(1000, b'"a0"'), (4000, b'"a1"')],
+            [(2000, b'"b0"'), (5000, b'"b1"')],
+            [(3000, b'"c0"'), (6000, b'"c1"')],
+        ])
+        output_pattern = os.path.join(
+            self.temp_dir.name, "out.p{partition}.jsonl")
+        lines = []
+
+        consume_parallel(
+            brokers=self.kafka_brokers,
+            credentials=self.credentials(),
+            topic="workers-topic",
+            workers=2,
+            partitions=None,
+            offset="beginning",
+            output_pattern=output_pattern,
+            merge=True,
+            writer=lines.append,
+            start_time=None,
+            end_time=None,
+            key="",
+            input_format="json",
+            output_format="json",
+            decorate="json",
+            proto_files=None,
+            verbose=False,
+            log_format="plain",
+        )
+
+        for partition in range(3):
+            with open(output_pattern.format(partition=partition), "r") as f:
+                self.assertEqual(2, len(f.readlines()))
+        self.assertEqual([1000, 2000, 3000, 4000, 5000, 6000],
+                         [json.loads(line)["timestamp"] for line in lines])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -3,18 +3,29 @@ import codecs
 import time
 import json
 import os
+import queue
+import sys
 import tempfile
 import unittest
 from unittest.mock import MagicMock, patch
 from parameterized import parameterized
-from confluent_kafka import Message
+from argparse import ArgumentTypeError
+from confluent_kafka import KafkaError, KafkaException, Message, OFFSET_BEGINNING
 from google.protobuf.json_format import ParseDict
 
 
 from kafkacat import (
     ProtoDecoder,
     consume_messages,
+    consume_parallel,
+    consume_worker,
+    main,
+    merge_outputs,
+    parse_partitions,
+    resolve_offset,
+    topic_partitions,
 )
+from protodecoder import VarintStream
 from transcoder import Transcoder
 
 TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), "testdata")
@@ -25,6 +36,40 @@ def load_test_data(filename):
         return json.load(f)
 
 
+def make_message(partition, value, timestamp=0):
+    mock_msg = MagicMock(spec=Message)
+    mock_msg.topic.return_value = "test-topic"
+    mock_msg.partition.return_value = partition
+    mock_msg.offset.return_value = 0
+    mock_msg.key.return_value = b"test.Main"
+    mock_msg.value.return_value = value
+    mock_msg.timestamp.return_value = (0, timestamp)
+    mock_msg.error.return_value = None
+    return mock_msg
+
+
+class FakeProcess:
+    def __init__(self, target, name, args, kwargs):
+        self.target = target
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.exitcode = None
+
+    def start(self):
+        try:
+            self.target(*self.args, **self.kwargs)
+            self.exitcode = 0
+        except Exception:
+            self.exitcode = 1
+
+    def is_alive(self):
+        return False
+
+    def join(self):
+        pass
+
+
 class KafkaLoaderTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -118,6 +163,286 @@ class KafkaLoaderTestCase(unittest.TestCase):
 
         self.assertEqual(expected_output, actual_output)
 
+    @parameterized.expand(
+        [
+            ("beginning", OFFSET_BEGINNING),
+            ("42", 42),
+            ("-10", 90),
+            ("-1000", 5),
+        ]
+    )
+    def test_resolve_offset(self, offset, expected):
+        consumer = MagicMock(name="Consumer")
+        consumer.get_watermark_offsets.return_value = (5, 100)
+        self.assertEqual(expected, resolve_offset(
+            consumer, "test-topic", 0, offset))
+
+    def test_parse_partitions(self):
+        self.assertEqual([3, 1, 2], parse_partitions("3,1,3,2,1"))
+        for partitions in ["-1", "1,,2", "a"]:
+            with self.assertRaises(ArgumentTypeError):
+                parse_partitions(partitions)
+
+    def test_topic_partitions(self):
+        consumer = MagicMock(name="Consumer")
+        topic_metadata = MagicMock(error=None, partitions={2: None, 0: None})
+        consumer.list_topics.return_value.topics = {
+            "test-topic": topic_metadata}
+        self.assertEqual([0, 2], topic_partitions(consumer, "test-topic"))
+
+        topic_metadata.partitions = {}
+        with self.assertRaises(ValueError):
+            topic_partitions(consumer, "test-topic")
+
+        topic_metadata.error = KafkaError(
+            KafkaError.UNKNOWN_TOPIC_OR_PART)
+        with self.assertRaises(KafkaException):
+            topic_partitions(consumer, "test-topic")
+
+    @patch("kafkacat.Consumer")
+    def test_consume_messages_assign(self, mock_consumer):
+        transcoder = Transcoder(
+            input_format="json", output_format="json", pretty=False, proto_decoder=None, key="")
+        consumer_mock = MagicMock(name="Consumer")
+        consumer_mock.poll.return_value = None
+        mock_consumer.return_value = consumer_mock
+
+        consume_messages(
+            brokers="localhost",
+            credentials=[],
+            topic="test-topic",
+            start_time=None,
+            end_time=None,
+            key="",
+            decorate="none",
+            transcoder=transcoder,
+            writer=MagicMock(),
+            partitions=[1, 3],
+            offset="beginning",
+        )
+
+        consumer_config = mock_consumer.call_args[0][0]
+        self.assertFalse(consumer_config["enable.auto.commit"])
+        self.assertEqual("kafkacat", consumer_config["group.id"])
+        consumer_mock.subscribe.assert_not_called()
+        consumer_mock.commit.assert_not_called()
+        assignment = consumer_mock.assign.call_args[0][0]
+        self.assertEqual([1, 3], [tp.partition for tp in assignment])
+        self.assertEqual([OFFSET_BEGINNING] * 2,
+                         [tp.offset for tp in assignment])
+
+    @patch("kafkacat.Consumer")
+    def test_consume_messages_partition_writers(self, mock_consumer):
+        transcoder = Transcoder(
+            input_format="json", output_format="json", pretty=False, proto_decoder=None, key="")
+        messages = []
+        for partition in [0, 1, 0]:
+            mock_msg = MagicMock(spec=Message)
+            mock_msg.partition.return_value = partition
+            mock_msg.key.return_value = b"test.Main"
+            mock_msg.value.return_value = f"{partition}".encode()
+            mock_msg.timestamp.return_value = (0, 0)
+            mock_msg.error.return_value = None
+            messages.append(mock_msg)
+        consumer_mock = MagicMock(name="Consumer")
+        consumer_mock.poll.side_effect = messages + [None]
+        mock_consumer.return_value = consumer_mock
+        writers = {0: MagicMock(), 1: MagicMock()}
+
+        consume_messages(
+            brokers="localhost",
+            credentials=[],
+            topic="test-topic",
+            start_time=None,
+            end_time=None,
+            key="",
+            decorate="none",
+            transcoder=transcoder,
+            writer=MagicMock(),
+            partitions=[0, 1],
+            partition_writers=writers,
+        )
+
+        self.assertEqual(2, writers[0].call_count)
+        self.assertEqual(1, writers[1].call_count)
+
+    @patch("kafkacat.Consumer")
+    def test_consume_worker_failure(self, mock_consumer):
+        consumer_mock = MagicMock(name="Consumer")
+        consumer_mock.poll.side_effect = KafkaException("broker down")
+        mock_consumer.return_value = consumer_mock
+        progress = MagicMock()
+
+        with self.assertRaises(RuntimeError):
+            consume_worker(
+                0, [0, 1], os.path.join(self.temp_dir.name,
+                                        "out.p{partition}.jsonl"), progress,
+                brokers="localhost",
+                credentials=[],
+                topic="test-topic",
+                start_time=None,
+                end_time=None,
+                key="",
+                input_format="json",
+                output_format="json",
+                decorate="none",
+                proto_files=None,
+                verbose=False,
+                log_format="plain",
+            )
+
+        progress.put.assert_called_once_with((0, 0))
+
+    def test_merge_outputs(self):
+        paths = []
+        for partition, timestamps in enumerate([[1, 4, 5], [2, 3, 6]]):
+            path = os.path.join(self.temp_dir.name, f"out.p{partition}.jsonl")
+            with open(path, "w") as f:
+                for timestamp in timestamps:
+                    print(json.dumps(
+                        {"partition": partition, "timestamp": timestamp}), file=f)
+            paths.append(path)
+        lines = []
+
+        merge_outputs(paths, lines.append)
+
+        self.assertEqual([1, 2, 3, 4, 5, 6],
+                         [json.loads(line)["timestamp"] for line in lines])
+
+    @patch("kafkacat.Consumer")
+    def test_consume_messages_end_time_per_partition(self, mock_consumer):
+        transcoder = Transcoder(
+            input_format="json", output_format="json", pretty=False, proto_decoder=None, key="")
+        consumer_mock = MagicMock(name="Consumer")
+        consumer_mock.poll.side_effect = [
+            make_message(0, b"0", 100),
+            make_message(0, b"0", 101),
+            make_message(1, b"1", 50),
+            make_message(1, b"1", 100),
+            make_message(1, b"1", 101),
+        ]
+        mock_consumer.return_value = consumer_mock
+        writers = {0: MagicMock(), 1: MagicMock()}
+
+        consume_messages(
+            brokers="localhost",
+            credentials=[],
+            topic="test-topic",
+            start_time=None,
+            end_time=100,
+            key="",
+            decorate="none",
+            transcoder=transcoder,
+            writer=None,
+            partitions=[0, 1],
+            partition_writers=writers,
+        )
+
+        self.assertEqual(1, writers[0].call_count)
+        self.assertEqual(2, writers[1].call_count)
+        self.assertEqual(4, consumer_mock.poll.call_count)
+        self.assertEqual([0, 1], [call.args[0][0].partition
+                                  for call in consumer_mock.pause.call_args_list])
+
+    @patch("kafkacat.Consumer")
+    def test_consume_worker_protobuf(self, mock_consumer):
+        test_data = load_test_data("protobuf1.json")
+        expected_output = codecs.decode(
+            test_data["expected_output"], "unicode_escape").encode()
+        consumer_mock = MagicMock(name="Consumer")
+        consumer_mock.poll.side_effect = [
+            make_message(0, test_data["input"].encode()), None]
+        mock_consumer.return_value = consumer_mock
+        output_pattern = os.path.join(
+            self.temp_dir.name, "out.p{partition}.bin")
+
+        consume_worker(
+            0, [0], output_pattern, MagicMock(),
+            brokers="localhost",
+            credentials=[],
+            topic="test-topic",
+            start_time=None,
+            end_time=None,
+            key="",
+            input_format=test_data["input_format"],
+            output_format=test_data["output_format"],
+            decorate="none",
+            proto_files=test_data["proto_files"],
+            verbose=False,
+            log_format="plain",
+        )
+
+        with open(output_pattern.format(partition=0), "rb") as f:
+            self.assertEqual([expected_output], list(VarintStream(f)))
+
+    def run_consume_parallel(self, worker, **kwargs):
+        writer = MagicMock()
+        with patch("kafkacat.multiprocessing.Process", FakeProcess), \
+                patch("kafkacat.multiprocessing.Queue", queue.Queue), \
+                patch("kafkacat.consume_worker", side_effect=worker) as mock_worker:
+            consume_parallel(
+                brokers="localhost",
+                credentials=[],
+                topic="test-topic",
+                output_pattern="out.p{partition}.jsonl",
+                writer=writer,
+                **kwargs,
+            )
+        return mock_worker, writer
+
+    @patch("kafkacat.merge_outputs")
+    def test_consume_parallel(self, mock_merge):
+        def worker(worker, partitions, output_pattern, progress, **kwargs):
+            progress.put((worker, len(partitions)))
+
+        with self.assertLogs("kafkacat", level="INFO") as logs:
+            mock_worker, writer = self.run_consume_parallel(
+                worker, workers=2, partitions=[0, 1, 2], merge=True)
+
+        self.assertEqual([[0, 2], [1]], [call.args[1]
+                         for call in mock_worker.call_args_list])
+        self.assertIn("INFO:kafkacat:Consumed 3 messages", logs.output)
+        mock_merge.assert_called_once_with(
+            ["out.p0.jsonl", "out.p1.jsonl", "out.p2.jsonl"], writer)
+
+    @patch("kafkacat.merge_outputs")
+    def test_consume_parallel_more_workers_than_partitions(self, mock_merge):
+        mock_worker, _ = self.run_consume_parallel(
+            lambda *args, **kwargs: None, workers=4, partitions=[0, 1], merge=False)
+
+        self.assertEqual([[0], [1]], [call.args[1]
+                         for call in mock_worker.call_args_list])
+        mock_merge.assert_not_called()
+
+    @patch("kafkacat.merge_outputs")
+    def test_consume_parallel_worker_failure(self, mock_merge):
+        def worker(worker, partitions, output_pattern, progress, **kwargs):
+            if worker == 1:
+                raise RuntimeError("broker down")
+
+        with self.assertRaisesRegex(RuntimeError, "worker-1"):
+            self.run_consume_parallel(
+                worker, workers=2, partitions=[0, 1], merge=True)
+        mock_merge.assert_not_called()
+
+    @parameterized.expand(
+        [
+            (["--workers=0"],),
+            (["--workers=2", "--output-pattern=out.jsonl"],),
+            (["--workers=2", "--merge"],),
+            (["--workers=2", "--output-format=protobuf_binary",
+              "--decorate=json"],),
+        ]
+    )
+    @patch("kafkacat.consume_parallel")
+    def test_main_rejects_workers_options(self, options, mock_consume_parallel):
+        argv = ["kafkacat.py", "--mode=consumer", "-b=localhost",
+                "-t=test-topic"] + options
+        with patch.object(sys, "argv", argv):
+            with self.assertRaises(ValueError):
+                main()
+        mock_consume_parallel.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()